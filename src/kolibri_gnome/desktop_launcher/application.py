@@ -2,11 +2,12 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+import collections
+import functools
 import json
 import os
-import subprocess
-import threading
 import time
+import weakref
 
 from gettext import gettext as _
 from urllib.parse import urlsplit
@@ -19,15 +20,65 @@ from pew.ui import PEWShortcut
 import gi
 
 gi.require_version("WebKit2", "4.0")
+from gi.repository import Gio
+from gi.repository import GLib
 from gi.repository import WebKit2
 
 from .. import config
 
-from ..globals import KOLIBRI_APP_DEVELOPER_EXTRAS, KOLIBRI_HOME, XDG_CURRENT_DESKTOP
+from ..globals import (
+    IS_ENDLESS_OS,
+    KOLIBRI_APP_DEVELOPER_EXTRAS,
+    KOLIBRI_HOME,
+    KOLIBRI_LOADER_URL,
+)
 from ..kolibri_service.kolibri_service import KolibriServiceManager
 from .utils import get_localized_file
 
 
+@functools.lru_cache(maxsize=128)
+def _t(message):
+    # Python's gettext looks for translation files on every call, so we
+    # remember the strings we translate for each new window.
+    return _(message)
+
+
+def N_(message):
+    # Marks a string for translation without translating it yet. The glib
+    # preset for xgettext already extracts strings passed to N_.
+    return message
+
+
+def _launch_default_for_uri(uri):
+    # Let GIO find and start the default handler for uri without waiting
+    # for it, which can involve D-Bus activation or the OpenURI portal.
+    Gio.AppInfo.launch_default_for_uri_async(
+        uri, None, None, _launch_default_for_uri_on_finish
+    )
+
+
+def _launch_default_for_uri_on_finish(source, result):
+    try:
+        Gio.AppInfo.launch_default_for_uri_finish(result)
+    except GLib.Error as error:
+        logger.warning("Error opening URI: %s", error.message)
+
+
+def _connect_weak_method(gobject, signal_name, method):
+    # Connecting a bound method would keep its instance alive for as long as
+    # gobject exists. Our windows own their web views, so that creates a
+    # reference cycle through GObject which Python's GC can't see.
+    weak_method = weakref.WeakMethod(method)
+
+    def on_signal(*args):
+        method = weak_method()
+        if method is None:
+            return None
+        return method(*args)
+
+    return gobject.connect(signal_name, on_signal)
+
+
 class RedirectLoading(Exception):
     pass
 
@@ -38,10 +89,10 @@ class RedirectError(Exception):
 
 class MenuEventHandler:
     def on_documentation(self):
-        subprocess.call(["xdg-open", "https://kolibri.readthedocs.io/en/latest/"])
+        _launch_default_for_uri("https://kolibri.readthedocs.io/en/latest/")
 
     def on_forums(self):
-        subprocess.call(["xdg-open", "https://community.learningequality.org/"])
+        _launch_default_for_uri("https://community.learningequality.org/")
 
     def on_new_window(self):
         self.open_window()
@@ -50,10 +101,10 @@ class MenuEventHandler:
         self.close()
 
     def on_open_in_browser(self):
-        subprocess.call(["xdg-open", self.get_current_or_target_url()])
+        _launch_default_for_uri(self.get_current_or_target_url())
 
     def on_open_kolibri_home(self):
-        subprocess.call(["xdg-open", KOLIBRI_HOME])
+        _launch_default_for_uri(GLib.filename_to_uri(KOLIBRI_HOME, None))
 
     def on_back(self):
         self.go_back()
@@ -84,8 +135,7 @@ class KolibriView(pew.ui.WebUIView, MenuEventHandler):
     def __init__(self, name, url, loader_url=None, **kwargs):
         self.__loader_url = loader_url
         self.__target_url = None
-        self.__load_url_lock = threading.Lock()
-        self.__redirect_thread = None
+        self.__redirect_pending = False
 
         super().__init__(name, url, **kwargs)
 
@@ -94,19 +144,31 @@ class KolibriView(pew.ui.WebUIView, MenuEventHandler):
         return self.__target_url
 
     def shutdown(self):
+        if self.__redirect_pending:
+            self.__redirect_pending = False
+            self.delegate.cancel_call_when_kolibri_ready(self.__on_kolibri_ready)
         self.delegate.remove_window(self)
 
     def load_url(self, url, with_redirect=True):
-        with self.__load_url_lock:
-            self.__target_url = url
-            try:
-                redirect_url = self.delegate.get_redirect_url(url)
-            except RedirectLoading:
-                self.__load_url_loading()
-            except RedirectError:
-                self.__load_url_error()
-            else:
-                super().load_url(redirect_url)
+        # Everything involved in loading a URL touches WebKit, which must be
+        # done from the main thread. Instead of guarding our own state with a
+        # lock, we make sure it is only ever modified from the main thread.
+        if GLib.MainContext.default().is_owner():
+            self.__do_load_url(url)
+        else:
+            pew.ui.run_on_main_thread(self.__do_load_url, url)
+
+    def __do_load_url(self, url):
+        self.__target_url = url
+        self.delegate.window_target_url_changed(self)
+        try:
+            redirect_url = self.delegate.get_redirect_url(url)
+        except RedirectLoading:
+            self.__load_url_loading()
+        except RedirectError:
+            self.__load_url_error()
+        else:
+            super().load_url(redirect_url)
         self.present_window()
 
     def get_current_or_target_url(self):
@@ -122,12 +184,9 @@ class KolibriView(pew.ui.WebUIView, MenuEventHandler):
         if self.current_url != self.__loader_url:
             super().load_url(self.__loader_url)
 
-        if not self.__redirect_thread:
-            self.__redirect_thread = pew.ui.PEWThread(
-                target=self.__do_redirect_on_load, args=()
-            )
-            self.__redirect_thread.daemon = True
-            self.__redirect_thread.start()
+        if not self.__redirect_pending:
+            self.__redirect_pending = True
+            self.delegate.call_when_kolibri_ready(self.__on_kolibri_ready)
 
     def __load_url_error(self):
         if self.current_url == self.__loader_url:
@@ -138,8 +197,8 @@ class KolibriView(pew.ui.WebUIView, MenuEventHandler):
                 self.evaluate_javascript, "window.onload = function() { show_error() }"
             )
 
-    def __do_redirect_on_load(self):
-        self.delegate.wait_for_kolibri()
+    def __on_kolibri_ready(self):
+        self.__redirect_pending = False
         self.load_url(self.__target_url)
 
     def open_window(self):
@@ -151,70 +210,76 @@ class KolibriView(pew.ui.WebUIView, MenuEventHandler):
 
 
 class KolibriWindow(KolibriView):
+    # The menu bar has the same shape for every window, so we describe it
+    # once here and only bind its handlers when each window is created.
+    MENU_BAR = (
+        (
+            N_("File"),
+            (
+                (
+                    N_("New Window"),
+                    "on_new_window",
+                    PEWShortcut("N", modifiers=["CTRL"]),
+                ),
+                (
+                    N_("Close Window"),
+                    "on_close_window",
+                    PEWShortcut("W", modifiers=["CTRL"]),
+                ),
+                None,
+                (N_("Open Kolibri Home Folder"), "on_open_kolibri_home", None),
+            ),
+        ),
+        (
+            N_("View"),
+            (
+                (N_("Reload"), "on_reload", None),
+                (
+                    N_("Actual Size"),
+                    "on_actual_size",
+                    PEWShortcut("0", modifiers=["CTRL"]),
+                ),
+                (N_("Zoom In"), "on_zoom_in", PEWShortcut("+", modifiers=["CTRL"])),
+                (N_("Zoom Out"), "on_zoom_out", PEWShortcut("-", modifiers=["CTRL"])),
+                None,
+                (N_("Open in Browser"), "on_open_in_browser", None),
+            ),
+        ),
+        (
+            N_("History"),
+            (
+                (N_("Back"), "on_back", PEWShortcut("[", modifiers=["CTRL"])),
+                (N_("Forward"), "on_forward", PEWShortcut("]", modifiers=["CTRL"])),
+            ),
+        ),
+        (
+            N_("Help"),
+            (
+                (N_("Documentation"), "on_documentation", PEWShortcut("F1")),
+                (N_("Community Forums"), "on_forums", None),
+            ),
+        ),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         # create menu bar, we do this per-window for cross-platform purposes
         menu_bar = pew.ui.PEWMenuBar()
 
-        file_menu = pew.ui.PEWMenu(_("File"))
-        file_menu.add(
-            _("New Window"),
-            handler=self.on_new_window,
-            shortcut=PEWShortcut("N", modifiers=["CTRL"]),
-        )
-        file_menu.add(
-            _("Close Window"),
-            handler=self.on_close_window,
-            shortcut=PEWShortcut("W", modifiers=["CTRL"]),
-        )
-        file_menu.add_separator()
-        file_menu.add(_("Open Kolibri Home Folder"), handler=self.on_open_kolibri_home)
-
-        menu_bar.add_menu(file_menu)
-
-        view_menu = pew.ui.PEWMenu(_("View"))
-        view_menu.add(_("Reload"), handler=self.on_reload)
-        view_menu.add(
-            _("Actual Size"),
-            handler=self.on_actual_size,
-            shortcut=PEWShortcut("0", modifiers=["CTRL"]),
-        )
-        view_menu.add(
-            _("Zoom In"),
-            handler=self.on_zoom_in,
-            shortcut=PEWShortcut("+", modifiers=["CTRL"]),
-        )
-        view_menu.add(
-            _("Zoom Out"),
-            handler=self.on_zoom_out,
-            shortcut=PEWShortcut("-", modifiers=["CTRL"]),
-        )
-        view_menu.add_separator()
-        view_menu.add(_("Open in Browser"), handler=self.on_open_in_browser)
-        menu_bar.add_menu(view_menu)
-
-        history_menu = pew.ui.PEWMenu(_("History"))
-        history_menu.add(
-            _("Back"),
-            handler=self.on_back,
-            shortcut=PEWShortcut("[", modifiers=["CTRL"]),
-        )
-        history_menu.add(
-            _("Forward"),
-            handler=self.on_forward,
-            shortcut=PEWShortcut("]", modifiers=["CTRL"]),
-        )
-        menu_bar.add_menu(history_menu)
-
-        help_menu = pew.ui.PEWMenu(_("Help"))
-        help_menu.add(
-            _("Documentation"),
-            handler=self.on_documentation,
-            shortcut=PEWShortcut("F1"),
-        )
-        help_menu.add(_("Community Forums"), handler=self.on_forums)
-        menu_bar.add_menu(help_menu)
+        for menu_title, menu_items in self.MENU_BAR:
+            menu = pew.ui.PEWMenu(_t(menu_title))
+            for menu_item in menu_items:
+                if menu_item is None:
+                    menu.add_separator()
+                    continue
+                item_title, handler_name, shortcut = menu_item
+                menu.add(
+                    _t(item_title),
+                    handler=getattr(self, handler_name),
+                    shortcut=shortcut,
+                )
+            menu_bar.add_menu(menu)
 
         self.set_menubar(menu_bar)
 
@@ -222,24 +287,29 @@ class KolibriWindow(KolibriView):
         # TODO: Implement this in pyeverywhere
         if KOLIBRI_APP_DEVELOPER_EXTRAS:
             self.gtk_webview.get_settings().set_enable_developer_extras(True)
-        self.gtk_webview.connect("decide-policy", self.__gtk_webview_on_decide_policy)
-        self.gtk_webview.connect("create", self.__gtk_webview_on_create)
+        _connect_weak_method(
+            self.gtk_webview, "decide-policy", self.__gtk_webview_on_decide_policy
+        )
+        _connect_weak_method(self.gtk_webview, "create", self.__gtk_webview_on_create)
 
         # Maximize windows on Endless OS
-        if hasattr(self, "gtk_window") and XDG_CURRENT_DESKTOP == "endless:GNOME":
-            self.gtk_window.maximize()
+        if IS_ENDLESS_OS:
+            gtk_window = getattr(self, "gtk_window", None)
+            if gtk_window is not None:
+                gtk_window.maximize()
 
         super().show()
 
     def __gtk_webview_on_decide_policy(self, webview, decision, decision_type):
         if decision_type == WebKit2.PolicyDecisionType.NEW_WINDOW_ACTION:
-            # Force internal _blank links to open in the same window
-            target_uri = decision.get_request().get_uri()
-            frame_name = decision.get_frame_name()
-            if frame_name == "_blank" and self.delegate.is_kolibri_app_url(target_uri):
-                decision.ignore()
-                pew.ui.run_on_main_thread(self.load_url, target_uri)
-                return True
+            # Force internal _blank links to open in the same window. We only
+            # need to look at the request for links targeting _blank.
+            if decision.get_frame_name() == "_blank":
+                target_uri = decision.get_request().get_uri()
+                if self.delegate.is_kolibri_app_url(target_uri):
+                    decision.ignore()
+                    pew.ui.run_on_main_thread(self.load_url, target_uri)
+                    return True
         return False
 
     def __gtk_webview_on_create(self, webview, navigation_action):
@@ -251,7 +321,7 @@ class KolibriWindow(KolibriView):
             window = self.delegate.open_window(target_uri)
             return window.gtk_webview
         else:
-            subprocess.call(["xdg-open", target_uri])
+            _launch_default_for_uri(target_uri)
             return None
 
 
@@ -261,17 +331,24 @@ class Application(pew.ui.PEWApp):
     handles_open_file_uris = True
 
     def __init__(self, *args, **kwargs):
-        loader_path = get_localized_file(
-            os.path.join(config.DATA_DIR, "assets", "_load-{}.html"),
-            os.path.join(config.DATA_DIR, "assets", "_load.html"),
-        )
-        self.__loader_url = "file://{path}".format(path=os.path.abspath(loader_path))
+        if KOLIBRI_LOADER_URL:
+            self.__loader_url = KOLIBRI_LOADER_URL
+        else:
+            loader_path = get_localized_file(
+                os.path.join(config.DATA_DIR, "assets", "_load-{}.html"),
+                os.path.join(config.DATA_DIR, "assets", "_load.html"),
+            )
+            self.__loader_url = f"file://{os.path.abspath(loader_path)}"
 
         self.__kolibri_service_manager = KolibriServiceManager()
+        self.__kolibri_url = self.__kolibri_service_manager.get_kolibri_url()
 
-        self.__windows = []
+        self.__windows = {}
+        self.__blank_windows = collections.OrderedDict()
         self.__did_init_service = False
 
+        self.__kolibri_ready_callbacks = []
+
         super().__init__(*args, **kwargs)
 
     def init_ui(self):
@@ -295,7 +372,18 @@ class Application(pew.ui.PEWApp):
             return
 
         self.__did_init_service = True
-        self.__kolibri_service_manager.start_kolibri()
+
+        kolibri_service_manager = self.__kolibri_service_manager
+        kolibri_service_manager.start_kolibri()
+
+        # The monitor process exits as soon as it knows whether Kolibri is
+        # responding, so we can wait for that from the main loop.
+        GLib.unix_fd_add_full(
+            GLib.PRIORITY_DEFAULT,
+            kolibri_service_manager.monitor_sentinel,
+            GLib.IOCondition.IN,
+            self.__on_kolibri_monitor_exited,
+        )
 
     def shutdown(self):
         logger.info("Stopping Kolibri service...")
@@ -305,16 +393,42 @@ class Application(pew.ui.PEWApp):
     def join(self):
         self.__kolibri_service_manager.join()
 
-    def wait_for_kolibri(self):
-        return self.__kolibri_service_manager.await_is_responding()
+    def call_when_kolibri_ready(self, callback):
+        # Pending callbacks are called on the main thread once Kolibri has
+        # either started or failed to start.
+        if self.__kolibri_service_manager.is_responding is not None:
+            pew.ui.run_on_main_thread(callback)
+        else:
+            self.__kolibri_ready_callbacks.append(callback)
+
+    def cancel_call_when_kolibri_ready(self, callback):
+        try:
+            self.__kolibri_ready_callbacks.remove(callback)
+        except ValueError:
+            pass
+
+    def __on_kolibri_monitor_exited(self, fd, condition):
+        kolibri_service_manager = self.__kolibri_service_manager
+        if kolibri_service_manager.is_responding is None:
+            logger.warning("Kolibri service monitor exited unexpectedly")
+            kolibri_service_manager.is_responding = False
+        self.__on_kolibri_ready()
+        return GLib.SOURCE_REMOVE
+
+    def __on_kolibri_ready(self):
+        callbacks = self.__kolibri_ready_callbacks
+        self.__kolibri_ready_callbacks = []
+        for callback in callbacks:
+            callback()
 
     def should_load_url(self, url):
-        if self.is_kolibri_app_url(url):
+        kolibri_service_manager = self.__kolibri_service_manager
+        if kolibri_service_manager.is_kolibri_app_url(url):
             return True
-        elif self.__is_loader_url(url):
-            return not self.__kolibri_service_manager.is_responding
+        elif url.startswith(self.__loader_url):
+            return not kolibri_service_manager.is_responding
         elif not url.startswith("about:"):
-            subprocess.call(["xdg-open", url])
+            _launch_default_for_uri(url)
             return False
         return True
 
@@ -322,12 +436,16 @@ class Application(pew.ui.PEWApp):
         return self.__kolibri_service_manager.is_kolibri_app_url(url)
 
     def get_redirect_url(self, url):
-        if self.__kolibri_service_manager.is_responding is None:
+        # is_responding is shared with the service processes, so we only
+        # read it once.
+        kolibri_service_manager = self.__kolibri_service_manager
+        is_responding = kolibri_service_manager.is_responding
+        if is_responding is None:
             raise RedirectLoading()
-        elif self.__kolibri_service_manager.is_responding is False:
+        elif is_responding is False:
             raise RedirectError()
-        elif self.__kolibri_service_manager.is_kolibri_app_url(url):
-            return self.__kolibri_service_manager.get_initialize_url(url)
+        elif kolibri_service_manager.is_kolibri_app_url(url):
+            return kolibri_service_manager.get_initialize_url(url)
         else:
             return url
 
@@ -335,7 +453,7 @@ class Application(pew.ui.PEWApp):
         return self.__open_window(target_url)
 
     def __open_window(self, target_url=None):
-        target_url = target_url or self.__kolibri_service_manager.get_kolibri_url()
+        target_url = target_url or self.__kolibri_url
         window = KolibriWindow(
             _("Kolibri"), target_url, delegate=self, loader_url=self.__loader_url
         )
@@ -344,59 +462,67 @@ class Application(pew.ui.PEWApp):
         return window
 
     def add_window(self, window):
-        self.__windows.append(window)
+        self.__windows[id(window)] = window
+        self.window_target_url_changed(window)
 
     def remove_window(self, window):
-        self.__windows.remove(window)
+        self.__windows.pop(id(window), None)
+        self.__blank_windows.pop(window, None)
+
+    def window_target_url_changed(self, window):
+        # If a window hasn't navigated away from the landing page, we will
+        # treat it as a "blank" window which can be reused to show content
+        # from handle_open_file_uris. Windows which are not open, or have
+        # been closed, are never blank.
+        if id(window) not in self.__windows:
+            return
+        elif window.target_url == self.__kolibri_url:
+            self.__blank_windows[window] = None
+        else:
+            self.__blank_windows.pop(window, None)
 
     def handle_open_file_uris(self, uris):
+        # Resolve all of the URIs before opening anything, so duplicates only
+        # open one window and we only need to look for a blank window once.
+        target_urls = collections.OrderedDict()
         for uri in uris:
-            self.__open_window_for_kolibri_scheme_uri(uri)
+            target_url = self.__get_target_url_for_kolibri_scheme_uri(uri)
+            if target_url:
+                target_urls[target_url] = None
+
+        blank_window = self.__find_blank_window()
 
-    def __open_window_for_kolibri_scheme_uri(self, kolibri_scheme_uri):
+        for target_url in target_urls:
+            if blank_window:
+                blank_window.load_url(target_url)
+                blank_window = None
+            else:
+                self.__open_window(target_url)
+
+    def __get_target_url_for_kolibri_scheme_uri(self, kolibri_scheme_uri):
         parse = urlsplit(kolibri_scheme_uri)
 
         if parse.scheme != "kolibri":
             logger.info("Invalid URI scheme: %s", kolibri_scheme_uri)
-            return
+            return None
 
         if parse.path and parse.path != "/":
+            # Sometimes the path has a / prefix. We need to avoid double
+            # slashes for Kolibri's JavaScript router.
             item_path = "/learn"
-            if parse.path.startswith("/"):
-                # Sometimes the path has a / prefix. We need to avoid double
-                # slashes for Kolibri's JavaScript router.
-                item_fragment = "/topics" + parse.path
-            else:
-                item_fragment = "/topics/" + parse.path
+            item_fragment = "/topics/" + parse.path.lstrip("/")
         elif parse.query:
             item_path = "/learn"
             item_fragment = "/search"
         else:
-            item_path = "/"
-            item_fragment = ""
+            return self.__kolibri_url
 
         if parse.query:
-            item_fragment += "?{}".format(parse.query)
+            item_fragment = f"{item_fragment}?{parse.query}"
 
-        target_url = self.__kolibri_service_manager.get_kolibri_url(
+        return self.__kolibri_service_manager.get_kolibri_url(
             path=item_path, fragment=item_fragment
         )
 
-        blank_window = self.__find_blank_window()
-
-        if blank_window:
-            blank_window.load_url(target_url)
-        else:
-            self.__open_window(target_url)
-
     def __find_blank_window(self):
-        # If a window hasn't navigated away from the landing page, we will
-        # treat it as a "blank" window which can be reused to show content
-        # from handle_open_file_uris.
-        for window in reversed(self.__windows):
-            if window.target_url == self.__kolibri_service_manager.get_kolibri_url():
-                return window
-        return None
-
-    def __is_loader_url(self, url):
-        return url and url.startswith(self.__loader_url)
+        return next(reversed(self.__blank_windows), None)
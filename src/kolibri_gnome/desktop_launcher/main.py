@@ -30,13 +30,13 @@ def main():
     logger.info("*  Kolibri GNOME App Initializing  *")
     logger.info("************************************")
     logger.info("")
-    logger.info("Started at: {}".format(datetime.datetime.today()))
+    logger.info("Started at: %s", datetime.datetime.today())
 
     app = Application()
     app.run()
     app.join()
 
-    logger.info("Stopped at: {}".format(datetime.datetime.today()))
+    logger.info("Stopped at: %s", datetime.datetime.today())
 
 
 if __name__ == "__main__":
@@ -1,25 +1,35 @@
-import os
+import functools
+
+from pathlib import Path
 
 from ..globals import get_current_language
 
 
 def get_localized_file(file_path_template, file_path_fallback):
-    language = get_current_language()
+    return _get_localized_file(
+        file_path_template, file_path_fallback, get_current_language()
+    )
+
 
+@functools.lru_cache(maxsize=8)
+def _get_localized_file(file_path_template, file_path_fallback, language):
     if not language:
         return file_path_fallback
 
-    file_path = file_path_template.format(language)
+    # TODO: Removing the country code like this isn't the same behaviour as
+    #       gettext. Ideally our translated asset files should either be
+    #       generated or should use the same language codes as the provided
+    #       translations.
+    language_base = language.split("_", 1)[0]
 
-    if not os.path.exists(file_path):
-        # TODO: Removing the country code like this isn't the same behaviour as
-        #       gettext. Ideally our translated asset files should either be
-        #       generated or should use the same language codes as the provided
-        #       translations.
-        language_base = language.split("_", 1)[0]
-        file_path = file_path_template.format(language_base)
+    if language_base == language:
+        candidate_languages = (language,)
+    else:
+        candidate_languages = (language, language_base)
 
-    if not os.path.exists(file_path):
-        file_path = file_path_fallback
+    for candidate_language in candidate_languages:
+        file_path = file_path_template.format(candidate_language)
+        if Path(file_path).is_file():
+            return file_path
 
-    return file_path
+    return file_path_fallback
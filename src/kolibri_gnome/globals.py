@@ -11,11 +11,13 @@ from . import config
 USER_HOME = os.path.expanduser("~")
 
 XDG_CURRENT_DESKTOP = os.environ.get("XDG_CURRENT_DESKTOP")
+IS_ENDLESS_OS = XDG_CURRENT_DESKTOP == "endless:GNOME"
 XDG_DATA_HOME = os.environ.get(
     "XDG_DATA_HOME", os.path.join(USER_HOME, ".local", "share")
 )
 
 KOLIBRI_APP_DEVELOPER_EXTRAS = os.environ.get("KOLIBRI_APP_DEVELOPER_EXTRAS")
+KOLIBRI_LOADER_URL = os.environ.get("KOLIBRI_LOADER_URL")
 
 DEFAULT_KOLIBRI_HOME = os.path.join(USER_HOME, ".kolibri")
 KOLIBRI_HOME = os.environ.get("KOLIBRI_HOME", DEFAULT_KOLIBRI_HOME)
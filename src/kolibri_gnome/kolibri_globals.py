@@ -1,13 +1,10 @@
-import collections
 import json
 import os
-from urllib.error import URLError
+from collections.abc import Mapping
 from urllib.parse import urlencode
 from urllib.parse import urljoin
 from urllib.parse import urlsplit
 from urllib.parse import urlunsplit
-from urllib.request import Request
-from urllib.request import urlopen
 
 from kolibri.utils.conf import OPTIONS
 
@@ -17,6 +14,11 @@ KOLIBRI_URL_PATH_PREFIX = OPTIONS["Deployment"]["URL_PATH_PREFIX"]
 KOLIBRI_BASE_URL = urljoin(
     "http://localhost:{}".format(KOLIBRI_HTTP_PORT), KOLIBRI_URL_PATH_PREFIX
 )
+KOLIBRI_BASE_URL_SPLIT = urlsplit(KOLIBRI_BASE_URL)
+
+# Kolibri runs on this machine, so if it takes longer than this to answer it
+# is not responding.
+KOLIBRI_API_TIMEOUT = 5
 
 
 class KolibriAPIError(Exception):
@@ -30,26 +32,32 @@ def is_kolibri_responding():
     except KolibriAPIError:
         return False
     else:
-        if isinstance(info, collections.Mapping):
+        if isinstance(info, Mapping):
             return info.get("application") == "kolibri"
         else:
             return False
 
 
-def kolibri_api_get_json(path, query={}):
-    base_url = urlsplit(KOLIBRI_BASE_URL)
-    path = urljoin(base_url.path, path.lstrip("/"))
-    request_url = base_url._replace(path=path, query=urlencode(query))
+def kolibri_api_get_json(path, query=None):
+    # urllib.request pulls in http.client, email and ssl. Only the monitor
+    # process makes requests, so other processes shouldn't pay for it.
+    from urllib.request import Request
+    from urllib.request import urlopen
+
+    path = urljoin(KOLIBRI_BASE_URL_SPLIT.path, path.lstrip("/"))
+    query = urlencode(query) if query else ""
+    request_url = KOLIBRI_BASE_URL_SPLIT._replace(path=path, query=query)
     request = Request(urlunsplit(request_url))
 
+    # URLError and socket timeouts are both subclasses of OSError.
     try:
-        response = urlopen(request)
-    except URLError as error:
+        response = urlopen(request, timeout=KOLIBRI_API_TIMEOUT)
+    except OSError as error:
         raise KolibriAPIError(error)
 
     try:
         data = json.load(response)
-    except json.JSONDecodeError as error:
+    except (OSError, json.JSONDecodeError) as error:
         raise KolibriAPIError(error)
 
     return data
@@ -1,13 +1,13 @@
+import functools
 import itertools
 import json
 import os
-import re
 from configparser import ConfigParser
 
 from ..globals import KOLIBRI_HOME
 
 CONTENT_EXTENSIONS_DIR = "/app/share/kolibri-content"
-CONTENT_EXTENSION_RE = r"^org.learningequality.Kolibri.Content.(?P<name>\w+)$"
+CONTENT_EXTENSION_PREFIX = "org.learningequality.Kolibri.Content."
 
 
 class ContentExtensionsList(object):
@@ -27,7 +27,10 @@ class ContentExtensionsList(object):
         self.__extensions = set(extensions)
 
     @classmethod
+    @functools.lru_cache(maxsize=None)
     def from_flatpak_info(cls):
+        # /.flatpak-info doesn't change while we are running, so the service
+        # processes can all share the same list instead of reading it again.
         extensions = set()
 
         flatpak_info = ConfigParser()
@@ -102,9 +105,11 @@ class ContentExtension(object):
 
     @classmethod
     def from_ref(cls, ref, commit):
-        match = re.match(CONTENT_EXTENSION_RE, ref)
-        if match:
-            name = match.group("name")
+        if not ref.startswith(CONTENT_EXTENSION_PREFIX):
+            return None
+
+        name = ref[len(CONTENT_EXTENSION_PREFIX) :]
+        if name and all(char.isalnum() or char == "_" for char in name):
             return cls(ref, name, commit, content_json=None)
         else:
             return None
@@ -3,133 +3,131 @@ import logging
 logger = logging.getLogger(__name__)
 
 import multiprocessing
+import multiprocessing.connection
+import os
 
-from ctypes import c_bool, c_char
+from ctypes import Structure, c_char, c_int8
+from urllib.parse import quote
+from urllib.parse import urljoin
+from urllib.parse import urlunsplit
 
+from .content_extensions import ContentExtensionsList
 from .kolibri_service_main import KolibriServiceMainProcess
 from .kolibri_service_monitor import KolibriServiceMonitorProcess
 from .kolibri_service_setup import KolibriServiceSetupProcess
 from .kolibri_service_stop import KolibriServiceStopProcess
 
+APP_KEY_LENGTH = 32
+
+
+class _KolibriServiceState(Structure):
+    # Each flag is -1 until it is set, or otherwise 0 or 1. An empty app_key
+    # has not been set.
+    _fields_ = [
+        ("is_starting", c_int8),
+        ("is_stopped", c_int8),
+        ("setup_result", c_int8),
+        ("is_responding", c_int8),
+        ("app_key", c_char * APP_KEY_LENGTH),
+    ]
+
 
 class KolibriServiceContext(object):
     """
-    Common context passed to KolibriService processes. This includes events
-    and shared values to facilitate communication.
+    Common context passed to KolibriService processes. This includes shared
+    values and a condition to wait for them to be set.
     """
 
-    APP_KEY_LENGTH = 32
+    UNSET = -1
 
     def __init__(self):
-        self.__is_starting_value = multiprocessing.Value(c_bool)
-        self.__is_starting_set_event = multiprocessing.Event()
-
-        self.__is_stopped_value = multiprocessing.Value(c_bool)
-        self.__is_stopped_set_event = multiprocessing.Event()
-
-        self.__setup_result_value = multiprocessing.Value(c_bool)
-        self.__setup_result_set_event = multiprocessing.Event()
-
-        self.__is_responding_value = multiprocessing.Value(c_bool)
-        self.__is_responding_set_event = multiprocessing.Event()
-
-        self.__app_key_value = multiprocessing.Array(c_char, self.APP_KEY_LENGTH)
-        self.__app_key_set_event = multiprocessing.Event()
+        # Every access goes through the condition's lock, so the shared
+        # value doesn't need a lock of its own.
+        self.__state = multiprocessing.Value(
+            _KolibriServiceState,
+            self.UNSET,
+            self.UNSET,
+            self.UNSET,
+            self.UNSET,
+            b"",
+            lock=False,
+        )
+        self.__condition = multiprocessing.Condition()
 
     @property
     def is_starting(self):
-        if self.__is_starting_set_event.is_set():
-            return self.__is_starting_value.value
-        else:
-            return None
+        return self.__get_flag("is_starting")
 
     @is_starting.setter
     def is_starting(self, is_starting):
-        self.__is_starting_value.value = is_starting
-        if is_starting is None:
-            self.__is_starting_set_event.clear()
-        else:
-            self.__is_starting_set_event.set()
+        self.__set_flag("is_starting", is_starting)
 
     def await_is_starting(self):
-        self.__is_starting_set_event.wait()
-        return self.is_starting
+        return self.__await_flag("is_starting")
 
     @property
     def is_stopped(self):
-        if self.__is_stopped_set_event.is_set():
-            return self.__is_stopped_value.value
-        else:
-            return None
+        return self.__get_flag("is_stopped")
 
     @is_stopped.setter
     def is_stopped(self, is_stopped):
-        self.__is_stopped_value.value = is_stopped
-        if is_stopped is None:
-            self.__is_stopped_set_event.clear()
-        else:
-            self.__is_stopped_set_event.set()
+        self.__set_flag("is_stopped", is_stopped)
 
     def await_is_stopped(self):
-        self.__is_stopped_set_event.wait()
-        return self.is_stopped
+        return self.__await_flag("is_stopped")
 
     @property
     def setup_result(self):
-        if self.__setup_result_set_event.is_set():
-            return self.__setup_result_value.value
-        else:
-            return None
+        return self.__get_flag("setup_result")
 
     @setup_result.setter
     def setup_result(self, setup_result):
-        self.__setup_result_value.value = setup_result
-        if setup_result is None:
-            self.__setup_result_set_event.clear()
-        else:
-            self.__setup_result_set_event.set()
+        self.__set_flag("setup_result", setup_result)
 
     def await_setup_result(self):
-        self.__setup_result_set_event.wait()
-        return self.setup_result
+        return self.__await_flag("setup_result")
 
     @property
     def is_responding(self):
-        if self.__is_responding_set_event.is_set():
-            return self.__is_responding_value.value
-        else:
-            return None
+        return self.__get_flag("is_responding")
 
     @is_responding.setter
     def is_responding(self, is_responding):
-        self.__is_responding_value.value = is_responding
-        if is_responding is None:
-            self.__is_responding_set_event.clear()
-        else:
-            self.__is_responding_set_event.set()
+        self.__set_flag("is_responding", is_responding)
 
     def await_is_responding(self):
-        self.__is_responding_set_event.wait()
-        return self.is_responding
+        return self.__await_flag("is_responding")
 
     @property
     def app_key(self):
-        if self.__app_key_set_event.is_set():
-            return self.__app_key_value.value.decode("ascii")
-        else:
-            return None
+        with self.__condition:
+            app_key = self.__state.app_key
+        return app_key.decode("ascii") if app_key else None
 
     @app_key.setter
     def app_key(self, app_key):
-        self.__app_key_value.value = bytes(app_key, encoding="ascii")
-        if app_key is None:
-            self.__app_key_set_event.clear()
-        else:
-            self.__app_key_set_event.set()
-
-    def await_app_key(self):
-        self.__app_key_set_event.wait()
-        return self.app_key
+        with self.__condition:
+            self.__state.app_key = bytes(app_key or "", encoding="ascii")
+            if app_key:
+                self.__condition.notify_all()
+
+    def __get_flag(self, name):
+        with self.__condition:
+            value = getattr(self.__state, name)
+        return None if value == self.UNSET else bool(value)
+
+    def __set_flag(self, name, value):
+        with self.__condition:
+            if value is None:
+                setattr(self.__state, name, self.UNSET)
+            else:
+                setattr(self.__state, name, bool(value))
+                self.__condition.notify_all()
+
+    def __await_flag(self, name):
+        with self.__condition:
+            self.__condition.wait_for(lambda: getattr(self.__state, name) != self.UNSET)
+            return bool(getattr(self.__state, name))
 
 
 class KolibriServiceManager(KolibriServiceContext):
@@ -138,62 +136,89 @@ class KolibriServiceManager(KolibriServiceContext):
     processes, and checking for availability.
     """
 
-    APP_INITIALIZE_URL = "/app/api/initialize/{key}"
-
     def __init__(self):
+        # Kolibri reads its options from the environment the first time they
+        # are used, and the service processes inherit them when we fork. So
+        # the content extensions must be in the environment before we import
+        # kolibri_globals.
+        ContentExtensionsList.from_flatpak_info().update_kolibri_environ(os.environ)
+
+        from ..kolibri_globals import KOLIBRI_BASE_URL
+        from ..kolibri_globals import KOLIBRI_BASE_URL_SPLIT
+
         super().__init__()
 
+        # These are checked for every URL the web views navigate to, and the
+        # base URL never changes, so we build them once.
+        self.__base_url = KOLIBRI_BASE_URL
+        self.__base_url_split = KOLIBRI_BASE_URL_SPLIT
+        self.__non_app_url_prefixes = tuple(
+            KOLIBRI_BASE_URL + prefix
+            for prefix in ("static/", "downloadcontent/", "content/storage/")
+        )
+
+        self.__initialize_url = None
+
         self.__main_process = KolibriServiceMainProcess(self)
         self.__monitor_process = KolibriServiceMonitorProcess(self)
         self.__setup_process = KolibriServiceSetupProcess(self)
         self.__stop_process = KolibriServiceStopProcess(self)
 
-    def get_initialize_url(self, next_url=None):
-        from ..kolibri_globals import KOLIBRI_BASE_URL
+    @property
+    def monitor_sentinel(self):
+        # A file descriptor which becomes ready when the monitor process
+        # exits, after it has set is_responding.
+        return self.__monitor_process.sentinel
 
-        app_key = self.await_app_key()
-        url = self.APP_INITIALIZE_URL.format(key=app_key)
+    def get_initialize_url(self, next_url=None):
+        # Called from the main thread, so we can't wait for the app key. It is
+        # shared before Kolibri responds and never changes, so we keep the URL.
+        if self.__initialize_url is None:
+            app_key = self.app_key
+            if app_key is None:
+                logger.warning("Kolibri app key is not available yet")
+                return next_url or self.__base_url
+            self.__initialize_url = f"{self.__base_url}app/api/initialize/{app_key}"
+        url = self.__initialize_url
         if next_url:
-            url += "?next={next_url}".format(next_url=next_url)
-        return KOLIBRI_BASE_URL + url.lstrip("/")
+            url += f"?next={quote(next_url, safe='')}"
+        return url
 
-    def get_kolibri_url(self, **kwargs):
-        from urllib.parse import urljoin
-        from urllib.parse import urlsplit
-        from urllib.parse import urlunsplit
-        from ..kolibri_globals import KOLIBRI_BASE_URL
-
-        base_url = urlsplit(KOLIBRI_BASE_URL)
-        if "path" in kwargs:
-            kwargs["path"] = urljoin(base_url.path, kwargs["path"].lstrip("/"))
-        target_url = base_url._replace(**kwargs)
-        return urlunsplit(target_url)
+    def get_kolibri_url(self, path=None, query=None, fragment=None):
+        base_url = self.__base_url_split
+        if path is None:
+            path = base_url.path
+        else:
+            path = urljoin(base_url.path, path.lstrip("/"))
+        if query is None:
+            query = base_url.query
+        if fragment is None:
+            fragment = base_url.fragment
+        return urlunsplit((base_url.scheme, base_url.netloc, path, query, fragment))
 
     def is_kolibri_app_url(self, url):
-        from ..kolibri_globals import KOLIBRI_BASE_URL
-
         if not url:
             return False
-        elif not url.startswith(KOLIBRI_BASE_URL):
-            return False
-        elif url.startswith(KOLIBRI_BASE_URL + "static/"):
-            return False
-        elif url.startswith(KOLIBRI_BASE_URL + "downloadcontent/"):
-            return False
-        elif url.startswith(KOLIBRI_BASE_URL + "content/storage/"):
-            return False
         else:
-            return True
+            return url.startswith(self.__base_url) and not url.startswith(
+                self.__non_app_url_prefixes
+            )
 
     def join(self):
-        if self.__main_process.is_alive():
-            self.__main_process.join()
-        if self.__monitor_process.is_alive():
-            self.__monitor_process.join()
-        if self.__setup_process.is_alive():
-            self.__setup_process.join()
-        if self.__stop_process.is_alive():
-            self.__stop_process.join()
+        # Reap each process as soon as it exits, in whatever order that is.
+        processes = {
+            process.sentinel: process
+            for process in (
+                self.__main_process,
+                self.__monitor_process,
+                self.__setup_process,
+                self.__stop_process,
+            )
+            if process.is_alive()
+        }
+        while processes:
+            for sentinel in multiprocessing.connection.wait(list(processes)):
+                processes.pop(sentinel).join()
 
     def start_kolibri(self):
         self.__setup_process.start()
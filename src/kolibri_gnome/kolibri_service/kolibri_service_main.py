@@ -1,7 +1,7 @@
 import json
 import multiprocessing
 import os
-from collections import Mapping
+from collections.abc import Mapping
 from contextlib import contextmanager
 
 from .content_extensions import ContentExtensionsList
@@ -32,17 +32,24 @@ class KolibriServiceMainProcess(multiprocessing.Process):
             self.__context.is_stopped = True
 
     def __run_kolibri_start(self):
+        self.__active_extensions.update_kolibri_environ(os.environ)
+
+        # Importing Kolibri takes a while, so we do it while the setup process
+        # is still running. Everything else needs to wait for setup. If the
+        # import fails, the monitor still needs to know we aren't starting.
+        try:
+            from kolibri.plugins.registry import registered_plugins
+            from kolibri.utils.cli import initialize, setup_logging, start
+        except Exception:
+            self.__context.is_starting = False
+            raise
+
         if not self.__context.await_setup_result():
             self.__context.is_starting = False
             return
 
         self.__context.is_starting = True
 
-        self.__active_extensions.update_kolibri_environ(os.environ)
-
-        from kolibri.plugins.registry import registered_plugins
-        from kolibri.utils.cli import initialize, setup_logging, start
-
         registered_plugins.register_plugins(["kolibri.plugins.app"])
 
         setup_logging(debug=False)
@@ -92,10 +99,10 @@ class KolibriServiceMainProcess(multiprocessing.Process):
                 options = json.load(f)
         except ValueError as e:
             logger.error(
-                "Attempted to load 'automatic_provision.json' but failed to parse JSON:\n{}".format(
-                    e
-                )
+                "Attempted to load 'automatic_provision.json' but failed to parse JSON:\n%s",
+                e,
             )
+            options = None
         except FileNotFoundError:
             options = None
 
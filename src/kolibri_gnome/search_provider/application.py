@@ -1,3 +1,6 @@
+import collections
+import threading
+
 from gi.repository import Gio
 from gi.repository import GLib
 
@@ -16,6 +19,10 @@ ICON_LOOKUP = {
     "slideshow": "image-x-generic",
 }
 
+# GetResultMetas only needs these fields for each node.
+NODE_DATA_KEYS = ("kind", "title", "description")
+NODE_DATA_CACHE_SIZE = 256
+
 
 class DbusMethodJob(object):
     def __init__(self, application, method_name, method, args, out_args, invocation):
@@ -106,10 +113,10 @@ class SearchProvider(object):
                 return result
         raise self.NoSearchHandlersError("No search handlers available")
 
-    def get_node_data(self, *args):
+    def get_nodes_data(self, *args):
         for search_handler in self.__search_handlers:
             try:
-                result = search_handler.get_node_data(*args)
+                result = search_handler.get_nodes_data(*args)
             except search_handler.SearchHandlerFailed:
                 pass
             else:
@@ -176,42 +183,45 @@ class SearchProvider(object):
         self.__activate_kolibri("", terms)
 
     def __activate_kolibri(self, item_id, terms):
-        kolibri_url = "kolibri:///{item_id}?searchTerm={term}".format(
-            item_id=item_id, term=" ".join(terms)
-        )
+        kolibri_url = f"kolibri:///{item_id}?searchTerm={' '.join(terms)}"
         app_info = Gio.DesktopAppInfo.new(config.APP_ID + ".desktop")
         return app_info.launch_uris([kolibri_url], None)
 
     def __get_item_ids_for_search(self, search):
-        return list(self.__iter_item_ids_for_search(search))
-
-    def __get_nodes_for_item_ids(self, item_ids):
-        return list(self.__iter_nodes_for_item_ids(item_ids))
-
-    def __iter_item_ids_for_search(self, search):
+        search = search.strip()
         if len(search) < 3:
-            return
+            return []
 
-        for node_data in self.get_search_results(search):
-            if node_data.get("kind") == "topic":
-                item_id = "t/{}".format(node_data.get("id"))
-            else:
-                item_id = "c/{}".format(node_data.get("id"))
-            yield item_id
-
-    def __iter_nodes_for_item_ids(self, item_ids):
-        for item_id in item_ids:
-            _kind_code, node_id = item_id.split("/", 1)
-            node_data = self.get_node_data(node_id)
-            node_icon = ICON_LOOKUP.get(
-                node_data.get("kind"), "application-x-executable"
-            )
-            yield {
-                "id": GLib.Variant("s", item_id),
-                "name": GLib.Variant("s", node_data.get("title")),
-                "description": GLib.Variant("s", node_data.get("description")),
-                "gicon": GLib.Variant("s", node_icon),
-            }
+        return [
+            self.__get_item_id_for_node_data(node_data)
+            for node_data in self.get_search_results(search)
+        ]
+
+    def __get_nodes_for_item_ids(self, item_ids):
+        if not item_ids:
+            return []
+
+        node_ids = [item_id.split("/", 1)[1] for item_id in item_ids]
+        nodes_data = self.get_nodes_data(node_ids)
+        return [
+            self.__get_node_for_node_data(item_id, node_data)
+            for item_id, node_data in zip(item_ids, nodes_data)
+        ]
+
+    @staticmethod
+    def __get_item_id_for_node_data(node_data):
+        kind_code = "t" if node_data.get("kind") == "topic" else "c"
+        return f"{kind_code}/{node_data.get('id')}"
+
+    @staticmethod
+    def __get_node_for_node_data(item_id, node_data):
+        node_icon = ICON_LOOKUP.get(node_data.get("kind"), "application-x-executable")
+        return {
+            "id": GLib.Variant("s", item_id),
+            "name": GLib.Variant("s", node_data.get("title")),
+            "description": GLib.Variant("s", node_data.get("description")),
+            "gicon": GLib.Variant("s", node_icon),
+        }
 
 
 class SearchHandler(object):
@@ -221,35 +231,63 @@ class SearchHandler(object):
     def get_search_results(self, search):
         raise NotImplementedError()
 
-    def get_node_data(self, node_id):
+    def get_nodes_data(self, node_ids):
         raise NotImplementedError()
 
 
 class LocalSearchHandler(SearchHandler):
     def __init__(self):
         self.__did_django_setup = False
+        self.__request_factory = None
+        self.__search_view = None
+        self.__node_view = None
+        self.__node_data_cache = collections.OrderedDict()
+        self.__node_data_cache_lock = threading.Lock()
 
     def get_search_results(self, search):
         self.__do_django_setup()
 
-        from kolibri.core.content.api import ContentNodeSearchViewset
-        from kolibri.dist.rest_framework.test import APIRequestFactory
-
-        request = APIRequestFactory().get("", {"search": search, "max_results": 10})
-        search_view = ContentNodeSearchViewset.as_view({"get": "list"})
-        response = search_view(request)
+        request = self.__request_factory.get("", {"search": search, "max_results": 10})
+        response = self.__search_view(request)
         return response.data.get("results", [])
 
-    def get_node_data(self, node_id):
+    def get_nodes_data(self, node_ids):
+        # GNOME Shell asks for metadata for the same results again as the
+        # user types, so we remember recent nodes Kolibri has found.
+        nodes_data = {
+            node_id: self.__get_cached_node_data(node_id) for node_id in node_ids
+        }
+        missing_node_ids = [
+            node_id for node_id, node_data in nodes_data.items() if node_data is None
+        ]
+        for node_id, response in self.__iter_node_responses(missing_node_ids):
+            if response.status_code == 200:
+                node_data = {key: response.data.get(key) for key in NODE_DATA_KEYS}
+                self.__set_cached_node_data(node_id, node_data)
+            else:
+                node_data = response.data
+            nodes_data[node_id] = node_data
+        return [nodes_data[node_id] for node_id in node_ids]
+
+    def __get_cached_node_data(self, node_id):
+        with self.__node_data_cache_lock:
+            node_data = self.__node_data_cache.get(node_id)
+            if node_data is not None:
+                self.__node_data_cache.move_to_end(node_id)
+            return node_data
+
+    def __set_cached_node_data(self, node_id, node_data):
+        with self.__node_data_cache_lock:
+            self.__node_data_cache[node_id] = node_data
+            if len(self.__node_data_cache) > NODE_DATA_CACHE_SIZE:
+                self.__node_data_cache.popitem(last=False)
+
+    def __iter_node_responses(self, node_ids):
         self.__do_django_setup()
 
-        from kolibri.core.content.api import ContentNodeViewset
-        from kolibri.dist.rest_framework.test import APIRequestFactory
-
-        request = APIRequestFactory().get("", {})
-        node_view = ContentNodeViewset.as_view({"get": "retrieve"})
-        response = node_view(request, pk=node_id)
-        return response.data
+        for node_id in node_ids:
+            request = self.__request_factory.get("", {})
+            yield node_id, self.__node_view(request, pk=node_id)
 
     def __do_django_setup(self):
         if self.__did_django_setup:
@@ -258,6 +296,17 @@ class LocalSearchHandler(SearchHandler):
         from kolibri.dist import django
 
         django.setup()
+
+        # These can only be imported after Django is set up, and building
+        # the views is the same work every time, so do it once.
+        from kolibri.core.content.api import ContentNodeSearchViewset
+        from kolibri.core.content.api import ContentNodeViewset
+        from kolibri.dist.rest_framework.test import APIRequestFactory
+
+        self.__request_factory = APIRequestFactory()
+        self.__search_view = ContentNodeSearchViewset.as_view({"get": "list"})
+        self.__node_view = ContentNodeViewset.as_view({"get": "retrieve"})
+
         self.__did_django_setup = True
 
 